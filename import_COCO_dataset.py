@@ -13,14 +13,26 @@ Formatted with the AI research and development project I helped work on in mind.
 #pip install fiftyone and pycocotools
 import fiftyone as fo
 import fiftyone.zoo as foz
+from fiftyone import ViewField as F
 from fiftyone.utils.coco import load_coco_detection_annotations, download_coco_dataset_split
 import time
 import webbrowser
 from enum import Enum
-import json, os, shutil
+import hashlib, json, math, os, shutil
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import accumulate
+
+SPLITS = ("train", "validation", "test")
 
 #clear existing data in fiftyone (if exists)
 def clear_existing_data(fiftyone_path):
+    #drop the zoo datasets cached by load_zoo_split first, so they aren't reused after their images are deleted.
+    #the unnamed split datasets from earlier runs are non-persistent, fiftyone deletes those itself
+    for name in fo.list_datasets("coco_*"):
+        fo.delete_dataset(name)
+        print(f"Deleted dataset: {name}")
+
+    #then remove the downloaded files left on disk
     if not os.path.exists(fiftyone_path):
         print(f"Path {fiftyone_path} does not exist")
         return
@@ -28,45 +40,53 @@ def clear_existing_data(fiftyone_path):
     if not contents:
         print("No existing datasets found")
         return
-    for item in contents:
-        item_path = os.path.join(fiftyone_path, item)
-        try:
-            if os.path.isfile(item_path) or os.path.islink(item_path):
-                os.remove(item_path)
-                print(f"Deleted file: {item_path}")
-            elif os.path.isdir(item_path):
-                shutil.rmtree(item_path)
-                print(f"Deleted folder: {item_path}")
-        except Exception as e:
-            print(f"Error deleting {item_path}: {e}")
+    #deleting many small files is I/O bound, so remove top level entries concurrently
+    item_paths = [os.path.join(fiftyone_path, item) for item in contents]
+    with ThreadPoolExecutor(max_workers=min(8, len(item_paths))) as executor:
+        futures = {executor.submit(delete_path, item_path): item_path for item_path in item_paths}
+        wait(futures)
+    for future, item_path in futures.items():
+        if future.exception() is not None:
+            print(f"Error deleting {item_path}: {future.exception()}")
+
+#delete a single file, link or folder
+def delete_path(item_path):
+    if os.path.isfile(item_path) or os.path.islink(item_path):
+        os.remove(item_path)
+        print(f"Deleted file: {item_path}")
+    elif os.path.isdir(item_path):
+        shutil.rmtree(item_path)
+        print(f"Deleted folder: {item_path}")
 
 #parameters for amount of images and splits, contains import and export of dataset
 class Dataset():
+    __slots__ = ("total_number_of_images", "train_split", "val_split", "test_split", "classes", "label_type", "pos_neg_ratio")
+
     def __init__(self, total_number_of_images, train_split, val_split, test_split, classes, label_type, pos_neg_ratio):
         self.total_number_of_images = total_number_of_images
         self.train_split = train_split
         self.val_split = val_split
         self.test_split = test_split
-        self.classes = [classes]
-        self.label_type = [label_type]
+        #accept a single name or a list of names, without nesting lists
+        self.classes = list(classes) if isinstance(classes, (list, tuple)) else [classes] if classes else []
+        self.label_type = list(label_type) if isinstance(label_type, (list, tuple)) else [label_type] if label_type else []
         self.pos_neg_ratio = pos_neg_ratio
     
     #number of images in each split (images with class) to negatives (images without class)
     def split_dataset(self): 
-        total = self.pos_neg_ratio[0] + self.pos_neg_ratio[1]
-        train_split_images = round(self.total_number_of_images * self.train_split)
-        train_split_negatives = round(train_split_images/total)*self.pos_neg_ratio[1]
-        train_split_positives = train_split_images - train_split_negatives
+        #round the cumulative split boundaries rather than each split, so the split sizes always add up to the total
+        split_fracs = [self.train_split, self.val_split, self.test_split]
+        #splits may only add up to 1.0 within 0.001, so clamp every boundary to the total and end on it exactly
+        boundaries = [min(round(self.total_number_of_images * frac), self.total_number_of_images) for frac in accumulate(split_fracs)]
+        boundaries[-1] = self.total_number_of_images
+        split_images = [end - start for start, end in zip([0] + boundaries, boundaries)]
 
-        val_split_images = round(self.total_number_of_images * self.val_split)
-        val_split_negatives = round(val_split_images/total)*self.pos_neg_ratio[1]
-        val_split_positives = val_split_images - val_split_negatives
-
-        test_split_images = round(self.total_number_of_images * self.test_split)
-        test_split_negatives = round(test_split_images/total)*self.pos_neg_ratio[1]
-        test_split_positives = test_split_images - test_split_negatives
-
-        return train_split_negatives, train_split_positives, val_split_negatives, val_split_positives, test_split_negatives, test_split_positives
+        total = self.pos_neg_ratio[0] + self.pos_neg_ratio[1]
+        counts = ()
+        for images in split_images:
+            negatives = round(images * self.pos_neg_ratio[1] / total)
+            counts += (negatives, images - negatives)
+        return counts
     
     #default 300 total images, 70% train, 20% val, 10% test, keyboard segmentation, 10:1 ratio positives to negatives
     def default_settings(self):
@@ -93,33 +113,22 @@ class Dataset():
         #Get splits
         while True:
             try:
-                print("Enter train split proportion (0-1): ")
-                self.train_split = float(input())
-                if self.train_split < 0 or self.train_split > 1:
-                    print("Invalid input, please enter a value between 0 and 1")
-                    continue
-                    
-                print("Enter val split proportion (0-1): ")
-                self.val_split = float(input())
-                if self.val_split < 0 or self.val_split > 1:
-                    print("Invalid input, please enter a value between 0 and 1")
-                    continue
-                    
-                print("Enter test split proportion (0-1): ")
-                self.test_split = float(input())
-                if self.test_split < 0 or self.test_split > 1:
-                    print("Invalid input, please enter a value between 0 and 1")
-                    continue
-                
-                #Check if splits add up to 1.0
-                total_split = self.train_split + self.val_split + self.test_split
-                if abs(total_split - 1.0) > 0.001:  # Allow small floating point errors
-                    print(f"Your splits add up to {total_split:.3f}, but should equal 1.0")
-                    print("Please re-enter your splits")
-                    continue
-                break
+                split_input = input("Enter train, val, test split proportions (0-1), separated by commas: ")
+                splits = [float(x.strip()) for x in split_input.split(",")]
             except ValueError:
                 print("Please enter valid numbers")
+                continue
+            if len(splits) != 3:
+                print("Please enter exactly three values")
+            elif any(split < 0 or split > 1 for split in splits):
+                print("Invalid input, please enter values between 0 and 1")
+            #Check if splits add up to 1.0, allowing small floating point errors
+            elif not math.isclose(sum(splits), 1.0, abs_tol=0.001):
+                print(f"Your splits add up to {sum(splits):.3f}, but should equal 1.0")
+            else:
+                self.train_split, self.val_split, self.test_split = splits
+                break
+            print("Please re-enter your splits")
         
         #Get ratio of positives to negatives
         while True:
@@ -159,84 +168,124 @@ class Dataset():
                 print("Please enter valid label type")
         
     
+    #load a split of COCO-2017, reusing the dataset from a previous run if the settings match
+    #num_workers is the number of threads fiftyone uses to download images concurrently
+    def load_zoo_split(self, split, max_samples, classes=None, num_workers=32):
+        config = {"split": split, "classes": classes, "label_types": self.label_type, "max_samples": max_samples, "include_license": "id"}
+        config_hash = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:8]
+        dataset_name = f"coco_{split}_{config_hash}"
+        if fo.dataset_exists(dataset_name):
+            dataset = fo.load_dataset(dataset_name)
+            #the images may have been deleted since (e.g. by clear_existing_data), only reuse if they are all still there
+            if all(os.path.exists(filepath) for filepath in dataset.values("filepath")):
+                print(f"Reusing cached dataset {dataset_name}")
+                return dataset
+            print(f"Images for cached dataset {dataset_name} are missing, reloading it")
+            fo.delete_dataset(dataset_name)
+        dataset = foz.load_zoo_dataset(
+            "coco-2017",
+            split=split,
+            only_matching=True,
+            include_id=True,
+            include_license="id",
+            label_types=self.label_type,
+            classes=classes,
+            max_samples=max_samples,
+            dataset_name=dataset_name,
+            drop_existing=False,
+            shuffle=True,
+            num_workers=num_workers,
+        )
+        dataset.persistent = True
+        return dataset
+
+    #tag the first train_count samples "train", the next val_count "validation" and the rest "test",
+    #then add each tagged group to its split dataset
+    def assign_splits(self, collection, train_count, val_count, datasets):
+        #cached zoo datasets keep their tags between runs, so clear the previous assignment first
+        collection.untag_samples(list(SPLITS))
+        collection[:train_count].tag_samples("train")
+        collection[train_count:train_count+val_count].tag_samples("validation")
+        collection[train_count+val_count:].tag_samples("test")
+        #split datasets are only created once they get samples, so empty splits don't take up a collection
+        for split in SPLITS:
+            split_view = collection.match_tags(split)
+            if len(split_view) == 0:
+                continue
+            if split not in datasets:
+                datasets[split] = fo.Dataset()
+            datasets[split].add_collection(split_view)
+
     def load_dataset(self):
         train_negatives, train_positives, val_negatives, val_positives, test_negatives, test_positives = self.split_dataset()
         
         print("Loading COCO-2017 dataset from FiftyOne Zoo...")
-        #split dataset into train, validation, and test
-        datasets = {"train": fo.Dataset(), "validation": fo.Dataset(), "test": fo.Dataset()}
+        #split dataset into train, validation, and test (created as needed by assign_splits)
+        datasets = {}
         #get positive instances from train split on fiftyone
         if self.pos_neg_ratio[0] != 0:
-            positives = foz.load_zoo_dataset(
-                "coco-2017",
-                split="train",
-                only_matching=True,
-                include_id=True,
-                include_license=True,
-                label_types=self.label_type,
-                classes=self.classes,
-                max_samples=(train_positives+val_positives+test_positives),
-                drop_existing=True,
-                shuffle=True,
-            )
+            positives = self.load_zoo_split("train", train_positives+val_positives+test_positives, classes=self.classes)
         #get negative instances from validation split on fiftyone
-        if self.pos_neg_ratio[1] != 0:
-            negatives = foz.load_zoo_dataset(
-                "coco-2017",
-                split="validation",
-                only_matching=True,
-                include_id=True,
-                include_license=True,
-                label_types=self.label_type,
-                max_samples=(train_negatives+val_negatives+test_negatives),
-                drop_existing=True,
-                shuffle=True,
-            )
+        needed_negatives = train_negatives+val_negatives+test_negatives
+        if self.pos_neg_ratio[1] != 0 and needed_negatives > 0:
+            #classes= only returns images containing the classes, so negatives need their own unfiltered load;
+            #drop any images that do contain one of the classes so they are true negatives
+            #load with headroom for the dropped images, doubling it until enough negatives are left or the split runs out.
+            #too small loads are kept cached, so later runs reuse every step instead of downloading it again
+            label_field = self.label_type[0]
+            max_samples = needed_negatives * 2
+            while True:
+                zoo_negatives = self.load_zoo_split("validation", max_samples)
+                negatives = zoo_negatives.match(~F(f"{label_field}.detections.label").contains(self.classes))
+                if len(negatives) >= needed_negatives or len(zoo_negatives) < max_samples:
+                    break
+                max_samples *= 2
+            negatives = negatives.limit(needed_negatives)
+            if len(negatives) < needed_negatives:
+                print(f"Only {len(negatives)} images without {self.classes} were found, test split will be smaller")
 
-        #There is definitely a more efficient way to do this, but for some reason this is the only way I could get it to work
-        count = 0
+        #tag each split in place and copy it over in the database, no samples pass through python
         if self.pos_neg_ratio[0] != 0:
-            for sample in positives:
-                if count < train_positives:
-                    datasets["train"].add_sample(sample)
-                elif count < train_positives + val_positives:
-                    datasets["validation"].add_sample(sample)
-                else:
-                    datasets["test"].add_sample(sample)
-                count += 1
-        count = 0
-        if self.pos_neg_ratio[1] != 0:
-            for sample in negatives:
-                if count < train_negatives:
-                    datasets["train"].add_sample(sample)
-                elif count < train_negatives + val_negatives:
-                    datasets["validation"].add_sample(sample)
-                else:
-                    datasets["test"].add_sample(sample)
-                count += 1
+            self.assign_splits(positives, train_positives, val_positives, datasets)
+        if self.pos_neg_ratio[1] != 0 and needed_negatives > 0:
+            self.assign_splits(negatives, train_negatives, val_negatives, datasets)
         
         print(f"All datasets loaded successfully!")
-        return datasets
+        return {split: datasets[split] for split in SPLITS if split in datasets}
     
-    def export_dataset(self, datasets, folder_path):
+    #export_media="symlink" links to the images in the fiftyone cache instead of copying them,
+    #so ~/fiftyone must be kept (not cleared) for as long as the exported dataset is used
+    def export_dataset(self, datasets, folder_path, export_media="symlink"):
         label_field = self.label_type[0]
-        for split in datasets:
-            datasets[split].export(
-                export_dir = os.path.join(folder_path, split),
-                dataset_type=fo.types.COCODetectionDataset,
-                label_field=label_field,
-                classes=self.classes,
-                export_media=True,
-            )
+        #symlinks need admin rights/developer mode on Windows, so copy there instead
+        if export_media == "symlink" and os.name == "nt":
+            export_media = True
+        #export is I/O bound (linking or copying images and writing labels), so export the splits concurrently
+        with ThreadPoolExecutor(max_workers=len(datasets) or 1) as executor:
+            futures = [
+                executor.submit(
+                    datasets[split].export,
+                    export_dir = os.path.join(folder_path, split),
+                    dataset_type=fo.types.COCODetectionDataset,
+                    label_field=label_field,
+                    classes=self.classes,
+                    export_media=export_media,
+                )
+                for split in datasets
+            ]
+            wait(futures)
+        #re-raise any error from the export threads
+        for future in futures:
+            future.result()
 
-#Image license information
+#Image license information, ids match the license ids in the COCO 2017 annotations
 class License(Enum):
-    CC_BY = (1, "Attribution License", "https://creativecommons.org/licenses/by/4.0/")
-    CC_BY_SA = (2, "Attribution-ShareAlike License", "https://creativecommons.org/licenses/by-sa/4.0/")
-    CC_BY_ND = (3, "Attribution-NoDerivs License", "https://creativecommons.org/licenses/by-nd/4.0/")
-    CC_BY_NC = (4, "Attribution-NonCommercial License", "https://creativecommons.org/licenses/by-nc/4.0/")
-    CC_BY_NC_SA = (5, "Attribution-NonCommercial-ShareAlike License", "https://creativecommons.org/licenses/by-nc-sa/4.0/")
-    CC_BY_NC_ND = (6, "Attribution-NonCommercial-NoDerivs License", "https://creativecommons.org/licenses/by-nc-nd/4.0/")
+    CC_BY = (4, "Attribution License", "https://creativecommons.org/licenses/by/4.0/")
+    CC_BY_SA = (5, "Attribution-ShareAlike License", "https://creativecommons.org/licenses/by-sa/4.0/")
+    CC_BY_ND = (6, "Attribution-NoDerivs License", "https://creativecommons.org/licenses/by-nd/4.0/")
+    CC_BY_NC = (2, "Attribution-NonCommercial License", "https://creativecommons.org/licenses/by-nc/4.0/")
+    CC_BY_NC_SA = (1, "Attribution-NonCommercial-ShareAlike License", "https://creativecommons.org/licenses/by-nc-sa/4.0/")
+    CC_BY_NC_ND = (3, "Attribution-NonCommercial-NoDerivs License", "https://creativecommons.org/licenses/by-nc-nd/4.0/")
     OTHER = (7, "No known copyright restrictions", "http://flickr.com/commons/usage/e")
     CC0 = (8, "United States Government Work", "http://www.usa.gov/copyright.shtml")
    
@@ -245,32 +294,25 @@ class License(Enum):
         self.id = id
         self.license_name = license_name
         self.url = url
-   
-    @classmethod
-    def from_name(cls, name):
-        """Get license enum from license name string"""
-        for license_enum in cls:
-            if license_enum.license_name == name:
-                return license_enum
-        return cls.CC0  # Default fallback
     
 def license_info(datasets):
-    #create a file with license information
-    file = open(os.path.join(os.getcwd(), "license_info.txt"), "w")
-
+    #build the license information text, then write the file in one go
+    parts = []
     for split in datasets:
-        file.write(f"\nLicense information for {split} dataset:\n")
-        file.write(f"Total images: {len(datasets[split])}\n")
-        license_counter = {license: 0 for license in License}
-        for sample in datasets[split]:
-            license_enum = License.from_name(sample.license)
-            license_counter[license_enum] += 1
+        parts.append(f"\nLicense information for {split} dataset:\n")
+        parts.append(f"Total images: {len(datasets[split])}\n")
+        #samples store the COCO license id, so count them in one aggregation in the database
+        id_counts = datasets[split].count_values("license")
+        license_counter = {license: id_counts.get(license.id, 0) for license in License}
+        #missing or unknown ids fall back to CC0
+        license_counter[License.CC0] += len(datasets[split]) - sum(license_counter.values())
         
-        file.write("Total images with license:\n")
+        parts.append("Total images with license:\n")
         for license_enum in License:
-            file.write(f"{license_enum.license_name}: {license_counter[license_enum]}\n")
+            parts.append(f"{license_enum.license_name}: {license_counter[license_enum]}\n")
 
-    file.close()
+    with open(os.path.join(os.getcwd(), "license_info.txt"), "w") as file:
+        file.write("".join(parts))
 
 def main():
     print("Enter dataset name:")
@@ -279,6 +321,7 @@ def main():
     os.makedirs(folder_path, exist_ok=True)
 
     print("Do you want to clear existing data? (y/n)")
+    print("Note: exported images are symlinks into ~/fiftyone, so clearing it breaks previously exported datasets")
     if input() == "y":
         clear_existing_data(os.path.expanduser("~/fiftyone"))
     